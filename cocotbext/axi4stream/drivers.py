@@ -32,7 +32,27 @@ from cocotb_bus.drivers import BusDriver
 from cocotb.triggers import ClockCycles, FallingEdge, First, RisingEdge
 from cocotb.result import TestFailure
 
-import copy
+from functools import lru_cache
+
+
+def _mark_last(iterable):
+    """Yield (item, is_last) pairs, looking one item ahead to detect the end.
+
+    Unlike len(), this also works on iterators and generators, without
+    materializing them.
+    """
+
+    iterator = iter(iterable)
+    try:
+        previous = next(iterator)
+    except StopIteration:
+        return
+
+    for current in iterator:
+        yield previous, False
+        previous = current
+
+    yield previous, True
 
 
 class Axi4StreamMaster(BusDriver):
@@ -64,13 +84,32 @@ class Axi4StreamMaster(BusDriver):
             if signal != "TREADY":
                 try:
                     default_value = \
-                        2 ** getattr(self.bus, signal).value.n_bits - 1 \
+                        (1 << getattr(self.bus, signal).value.n_bits) - 1 \
                         if signal in ("TSTRB", "TKEEP") else 0
                     getattr(self.bus, signal).setimmediatevalue(default_value)
                 except AttributeError:
                     pass
 
-    @cocotb.coroutine
+        # Resolve the handshake signals once, as they are accessed on every
+        # transfer (None if the signal is not present on the bus)
+        self._tvalid = self.bus.TVALID
+        self._tready = getattr(self.bus, "TREADY", None)
+        self._tdata = getattr(self.bus, "TDATA", None)
+        self._tlast = getattr(self.bus, "TLAST", None)
+
+        # Map the name of each drivable signal present on the bus to its
+        # handle, to avoid resolving it again on every transfer
+        self._signal_handles = {
+            signal: getattr(self.bus, signal)
+            for signal in self._optional_signals
+            if signal != "TREADY" and hasattr(self.bus, signal)
+        }
+        # Same as above, but for when TLAST is controlled by the driver
+        self._signal_handles_no_tlast = {
+            signal: handle for signal, handle in self._signal_handles.items()
+            if signal != "TLAST"
+        }
+
     async def write(self, data, sync=True, tlast_on_last=True):
         """
         Write one or more values on the bus.
@@ -82,6 +121,8 @@ class Axi4StreamMaster(BusDriver):
                 write. Missing signals are kept constant.
                 Each int represents the TDATA signal in the AXI4-Stream
                 transfer (so, they are equivalent to {"TDATA": int_value}).
+                The data is not copied, so it must not be modified until
+                the write is complete.
             sync (bool, optional): wait for rising edge on clock initially.
                 Defaults to True.
             tlast_on_last(bool, optional): assert TLAST on the last word
@@ -98,48 +139,90 @@ class Axi4StreamMaster(BusDriver):
         except TypeError:
             data = (data,)    # If data is not iterable, make it
 
-        data = copy.copy(data)
+        # Bind the edge triggers once per write, instead of calling
+        # RisingEdge again for each transfer
+        clk_redge = RisingEdge(self.clock)
+        tready = self._tready
+        if tready is not None:
+            tready_redge = RisingEdge(tready)
 
         if sync:
-            await RisingEdge(self.clock)
+            await clk_redge
 
-        self.bus.TVALID.value = 1
+        # The bus topology and the options are fixed for the whole write:
+        # resolve them once, so that the loop only branches on the data
+        tvalid = self._tvalid
+        tdata = self._tdata
+        tlast = self._tlast if tlast_on_last else None
+        signal_handles = self._signal_handles_no_tlast if tlast_on_last \
+            else self._signal_handles
 
-        for index, word in enumerate(data):
-            # If word is not a dict, make it (using word as "TDATA")
-            if not isinstance(word, dict):
-                word = {"TDATA": word}
-
-            for signal, value in word.items():
-                err_msg = \
-                    f"During transfer {index}, signal {signal} has been " \
-                    "passed, but it is "
-                if signal == 'TREADY':
-                    raise TestFailure(err_msg + "an input for the driver")
-                elif signal == 'TLAST' and tlast_on_last:
-                    raise TestFailure(err_msg + "already controlled by the "
-                                                "driver (tlast_on_last=True)")
-                elif signal not in Axi4StreamMaster._optional_signals:
-                    raise TestFailure(err_msg + "not a valid "
-                                                "AXI4-Stream signal")
+        tvalid.value = 1
 
-                try:
-                    getattr(self.bus, signal).value = value
-                except AttributeError:
-                    raise TestFailure(err_msg + "not present on the bus")
-
-            if hasattr(self.bus, "TLAST") and tlast_on_last and \
-               index == len(data) - 1:
-                self.bus.TLAST.value = 1
-
-            await RisingEdge(self.clock)
-            while hasattr(self.bus, "TREADY") and not self.bus.TREADY.value:
-                await RisingEdge(self.clock)
+        for index, (word, last) in enumerate(_mark_last(data)):
+            if not isinstance(word, dict):
+                # A plain value is the TDATA of the transfer: drive it
+                # directly, without wrapping it in a dict
+                if tdata is None:
+                    raise self._signal_error(index, "TDATA", tlast_on_last)
+                tdata.value = word
+            else:
+                for signal, value in word.items():
+                    handle = signal_handles.get(signal)
+                    if handle is None:
+                        raise self._signal_error(index, signal, tlast_on_last)
+                    handle.value = value
+
+            if tlast is not None and last:
+                tlast.value = 1
+
+            await clk_redge
+            if tready is not None:
+                # When the slave is not ready, sleep until TREADY rises
+                # instead of waking up on every clock cycle, then check it
+                # again on the following clock edge (in case it has been
+                # de-asserted in the meantime)
+                while not tready.value:
+                    await tready_redge
+                    await clk_redge
+
+        if tlast is not None:
+            tlast.value = 0
+
+        tvalid.value = 0
+
+    async def write_packets(self, packets, sync=True):
+        """
+        Write several packets back to back on the bus.
 
-        if hasattr(self.bus, "TLAST") and tlast_on_last:
-            self.bus.TLAST.value = 0
+        Args:
+            packets (iterable): the packets to write, each one in any of the
+                formats accepted by write. TLAST is asserted on the last word
+                of each packet.
+            sync (bool, optional): wait for rising edge on clock initially.
+                Defaults to True.
+        """
 
-        self.bus.TVALID.value = 0
+        for packet in packets:
+            await self.write(packet, sync=sync)
+            # The following packets start right after the previous one
+            sync = False
+
+    def _signal_error(self, index, signal, tlast_on_last):
+        """Build the error for a signal that cannot be driven by write."""
+
+        err_msg = \
+            f"During transfer {index}, signal {signal} has been " \
+            "passed, but it is "
+        if signal == 'TREADY':
+            return TestFailure(err_msg + "an input for the driver")
+        elif signal == 'TLAST' and tlast_on_last:
+            return TestFailure(err_msg + "already controlled by the "
+                                         "driver (tlast_on_last=True)")
+        elif signal not in Axi4StreamMaster._optional_signals:
+            return TestFailure(err_msg + "not a valid "
+                                         "AXI4-Stream signal")
+        return TestFailure(err_msg + "not present on the bus")
 
     @property
     def n_bits(self):
@@ -161,7 +244,7 @@ class Axi4StreamSlave(BusDriver):
     ]
 
     def __init__(self, entity, name, clock, tready_delay=-1,
-                 consecutive_transfers=0):
+                 consecutive_transfers=0, cache_key=None):
         """
             Initialization of AxiStreamSlave
 
@@ -186,6 +269,12 @@ class Axi4StreamSlave(BusDriver):
                     of consecutive transfers (non negative number).
                     Default to 0, which allows an unlimited number of
                     consecutive transfers.
+                cache_key (callable, optional): function called with the bus
+                    whenever tready_delay or consecutive_transfers would be
+                    called, returning a hashable key. When set, the values
+                    returned by those functions are cached per key, so they
+                    are called only once for each distinct key.
+                    Defaults to None, which calls them every time.
         """
 
         BusDriver.__init__(self, entity, name, clock)
@@ -202,42 +291,78 @@ class Axi4StreamSlave(BusDriver):
                 self.tready_delay = tready_delay
                 self.consecutive_transfers = consecutive_transfers
 
+                # Turn both parameters into functions of the bus, optionally
+                # cached by cache_key
+                self._tready_delay_fn = \
+                    self._bus_function("tready_delay", cache_key)
+                self._consecutive_transfers_fn = \
+                    self._bus_function("consecutive_transfers", cache_key)
+
                 cocotb.start_soon(self._receive_data())
 
-    @cocotb.coroutine
+    def _bus_function(self, name, cache_key):
+        """Return a function of the bus evaluating the attribute name,
+        optionally cached.
+
+        The attribute is read on every call, so that it can still be changed
+        after the initialization, either to a number or to a function.
+        """
+
+        if cache_key is None:
+            def evaluate(bus):
+                value = getattr(self, name)
+                return value(bus) if callable(value) else value
+
+            return evaluate
+
+        # The function itself is part of the key, so that replacing it does
+        # not return the values cached for the previous one
+        cached = lru_cache(maxsize=256)(
+            lambda key, function: function(self.bus))
+
+        def evaluate_cached(bus):
+            value = getattr(self, name)
+            return cached(cache_key(bus), value) if callable(value) else value
+
+        return evaluate_cached
+
     async def _receive_data(self):
 
+        tvalid = self.bus.TVALID
+
+        # Bind the edge triggers once, instead of calling RisingEdge and
+        # FallingEdge again on every handshake
+        clk_redge = RisingEdge(self.clock)
+        tvalid_redge = RisingEdge(tvalid)
+        tvalid_fedge = FallingEdge(tvalid)
+
+        tready_delay_fn = self._tready_delay_fn
+        consecutive_transfers_fn = self._consecutive_transfers_fn
+
         while True:
             # Wait for a high TVALID, if not already high
-            if not self.bus.TVALID.value:
-                await RisingEdge(self.bus.TVALID)
+            if not tvalid.value:
+                await tvalid_redge
 
             # Wait either for the required number of clock cycles or for a low
             # TVALID. By AXI4-Stream standard, the master should not de-assert
             # TVALID until at least one transfer has been performed but, if it
             # does it anyways, just re-start the wait.
-            if callable(self.tready_delay):
-                tready_high_delay = ClockCycles(self.clock,
-                                                self.tready_delay(self.bus))
-            else:
-                tready_high_delay = ClockCycles(self.clock, self.tready_delay)
+            tready_high_delay = ClockCycles(self.clock,
+                                            tready_delay_fn(self.bus))
 
-            trigger = await First(tready_high_delay,
-                                  FallingEdge(self.bus.TVALID))
+            trigger = await First(tready_high_delay, tvalid_fedge)
 
             if trigger is tready_high_delay:
                 self.bus.TREADY.value = 1
 
-                if callable(self.consecutive_transfers):
-                    num_cycles = self.consecutive_transfers(self.bus)
-                else:
-                    num_cycles = self.consecutive_transfers
+                num_cycles = consecutive_transfers_fn(self.bus)
 
                 if num_cycles != 0 and tready_high_delay != -1:
                     await First(ClockCycles(self.clock, num_cycles),
-                                FallingEdge(self.bus.TVALID))
+                                tvalid_fedge)
                 else:
-                    await FallingEdge(self.bus.TVALID)
+                    await tvalid_fedge
 
                 self.bus.TREADY.value = 0
-                await RisingEdge(self.clock)
+                await clk_redge
@@ -27,10 +27,12 @@
 
 """Monitors for Advanced Microcontroller Bus Architecture."""
 
-import cocotb
 from cocotb_bus.monitors import BusMonitor
 from cocotb.triggers import RisingEdge
 
+from array import array
+from operator import attrgetter
+
 
 class Axi4Stream(BusMonitor):
     """AXI4Stream bus monitor"""
@@ -45,7 +47,8 @@ class Axi4Stream(BusMonitor):
         tuple(signal for signal in _optional_signals if signal != "TREADY")
 
     def __init__(self, *args, packets=False, aux_signals=False,
-                 data_type="buff", **kwargs):
+                 data_type="buff", collect_raw=False, buffer_size=1024,
+                 tstatus=False, **kwargs):
         """Initialization of Axi4Stream
 
         Args:
@@ -58,19 +61,50 @@ class Axi4Stream(BusMonitor):
                 When false, return an int for each transfer representing the
                 value of the TDATA signal
             data_type (str, optional): select the data type passed to _recv,
-                either "buff" (for binary buffers of bytes) or "integer".
+                either "buff" (for binary buffers of bytes), "integer" or
+                "binstr" (for strings of binary digits, which skips the
+                conversion to int).
+            collect_raw (bool, optional): collect the TDATA values of each
+                packet in a pre-allocated array.array of unsigned 64 bit
+                integers and pass a copy of it to _recv, instead of a list of
+                ints. The array can be wrapped without copies by
+                numpy.frombuffer, e.g. to process it in @numba.njit callbacks.
+                Requires packets=True, aux_signals=False,
+                data_type="integer" and a TDATA of at most 64 bits.
+                Defaults to False.
+            buffer_size (int, optional): initial size (in transfers) of the
+                collect_raw buffer; it is doubled whenever a packet does not
+                fit in it.
+                Defaults to 1024.
+            tstatus (bool, optional): sample TVALID, TREADY and TLAST from
+                the TSTATUS signal of the bus, a 3 bit concatenation of
+                TREADY, TVALID and TLAST (from MSB to LSB), with a single read
+                per clock cycle. TSTATUS is not an AXI4-Stream signal, so it
+                has to be added to the design for this purpose.
+                Defaults to False (sample the signals separately).
             **kwargs: passed directly to the BusMonitor parent constructor.
         """
 
+        if tstatus:
+            # TSTATUS is not an AXI4-Stream signal: only look it up on the
+            # buses that opted in
+            self._optional_signals = \
+                Axi4Stream._optional_signals + ["TSTATUS"]
+
         BusMonitor.__init__(self, *args, **kwargs)
 
         if packets and not hasattr(self.bus, "TLAST"):
             raise AttributeError("\'packets=True\', but \'TLAST\' is missing "
                                  "on this bus")
 
-        if data_type not in ("buff", "integer"):
-            raise AttributeError("data_type must be either \"buff\" or "
-                                 "\"integer\"")
+        if tstatus and (not hasattr(self.bus, "TSTATUS") or
+                        self.bus.TSTATUS.value.n_bits != 3):
+            raise AttributeError("\'tstatus=True\', but a 3 bit "
+                                 "\'TSTATUS\' is missing on this bus")
+
+        if data_type not in ("buff", "integer", "binstr"):
+            raise AttributeError("data_type must be either \"buff\", "
+                                 "\"integer\" or \"binstr\"")
 
         self.packets = packets
         self.aux_signals = aux_signals
@@ -81,36 +115,114 @@ class Axi4Stream(BusMonitor):
                   if hasattr(self.bus, signal) and
                   (signal != "TLAST" or not packets))
 
-    @cocotb.coroutine
+        # Resolve the handshake signals once (None if not present)
+        self._tvalid = self.bus.TVALID
+        self._tready = getattr(self.bus, "TREADY", None)
+        self._tdata = getattr(self.bus, "TDATA", None)
+        self._tlast = getattr(self.bus, "TLAST", None)
+        self._tstatus = self.bus.TSTATUS if tstatus else None
+
+        # Pre-resolve the handles sampled on every transfer and the getter
+        # of their value in the requested data type
+        self._sample_handles = \
+            tuple((signal, getattr(self.bus, signal))
+                  for signal in self.bus_optional_signals)
+        self._get_value = attrgetter("value." + data_type)
+
+        if collect_raw:
+            if not packets or aux_signals or data_type != "integer":
+                raise AttributeError("\'collect_raw=True\' requires "
+                                     "\'packets=True\', "
+                                     "\'aux_signals=False\' and "
+                                     "\'data_type=\"integer\"\'")
+            if self._tdata is None or self._tdata.value.n_bits > 64:
+                raise AttributeError("\'collect_raw=True\' requires a "
+                                     "\'TDATA\' of at most 64 bits")
+
+        self.collect_raw = collect_raw
+        self._buffer = array("Q", bytes(8 * max(buffer_size, 1))) \
+            if collect_raw else None
+
     async def _monitor_recv(self):
         """Watch the pins and reconstruct transfers and packets."""
 
-        def valid_transfer():
-            if hasattr(self.bus, "TREADY"):
-                return self.bus.TVALID.value and self.bus.TREADY.value
-            return self.bus.TVALID.value
-
-        def get_signal_value(signal):
-            handle = getattr(self.bus, signal, None)
-            return getattr(handle.value, self.data_type) if handle else None
-
         # Avoid spurious object creation by recycling
         clk_redge = RisingEdge(self.clock)
 
+        # This coroutine may be started by the BusMonitor constructor, before
+        # the attributes below are set: read them after the first clock edge
+        await clk_redge
+
+        # Bind the attributes used on every clock cycle to locals
+        tvalid = self._tvalid
+        tready = self._tready
+        tdata = self._tdata
+        tlast = self._tlast
+        tstatus = self._tstatus
+        get_value = self._get_value
+        aux_signals = self.aux_signals
+        packets = self.packets
+        collect_raw = self.collect_raw
+        buffer = self._buffer
+        sample_handles = self._sample_handles
+
+        tvalid_redge = RisingEdge(tvalid)
+        tready_redge = RisingEdge(tready) if tready is not None else None
+
         packet = []
+        index = 0
         while True:
-            await clk_redge
+            if tstatus is None:
+                valid = tvalid.value
+                handshake = valid and (tready is None or tready.value)
+            else:
+                # {TREADY, TVALID, TLAST}, sampled with a single read. The
+                # binary digits are compared as strings, so that unresolved
+                # bits (e.g. before the reset) read as low instead of raising
+                status = tstatus.value.binstr
+                valid = status[1] == "1"
+                handshake = status[:2] == "11"
+
+            if not valid:
+                # Idle bus: sleep until TVALID rises, instead of waking up on
+                # every clock cycle
+                await tvalid_redge
+
+            elif handshake:
+                if collect_raw:
+                    if index == len(buffer):
+                        # The packet does not fit, double the buffer
+                        buffer.extend(buffer)
+                    buffer[index] = tdata.value.integer
+                    index += 1
+                    if (status[2] == "1" if tstatus is not None
+                            else tlast.value):
+                        self._recv(buffer[:index])
+                        index = 0
 
-            if valid_transfer():
-                if self.aux_signals:
-                    packet.append({signal: get_signal_value(signal)
-                                  for signal in self.bus_optional_signals})
                 else:
-                    packet.append(get_signal_value("TDATA"))
-
-                if not self.packets:
-                    self._recv(packet[0])
-                    packet = []
-                elif self.bus.TLAST.value:
-                    self._recv(packet)
-                    packet = []
+                    if aux_signals:
+                        transfer = {signal: get_value(handle)
+                                    for signal, handle in sample_handles}
+                    elif tdata is not None:
+                        transfer = get_value(tdata)
+                    else:
+                        transfer = None
+
+                    if not packets:
+                        # Single transfers are passed directly, without
+                        # allocating a packet list for each of them
+                        self._recv(transfer)
+                    else:
+                        packet.append(transfer)
+                        if (status[2] == "1" if tstatus is not None
+                                else tlast.value):
+                            self._recv(packet)
+                            packet = []
+
+            elif tready_redge is not None:
+                # Back-pressure: no transfer can happen until TREADY rises,
+                # so sleep until then instead of waking up on every cycle
+                await tready_redge
+
+            await clk_redge
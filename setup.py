@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from setuptools import setup, find_namespace_packages
+from setuptools import setup
 
 setup(
     name="cocotbext.axi4stream",
@@ -9,9 +9,9 @@ setup(
     author_email="nicola.corna@polimi.it",
     description="Cocotb AXI4-Stream module",
     url="https://github.com/corna/cocotbext.axi4stream.git",
-    packages=find_namespace_packages(include=['cocotbext.*']),
-    install_requires=['cocotb'],
-    python_requires='>=3.5',
+    packages=['cocotbext.axi4stream'],
+    install_requires=['cocotb', 'cocotb-bus'],
+    python_requires='>=3.7',
     classifiers=[
         "Programming Language :: Python",
         "License :: OSI Approved :: MIT License",
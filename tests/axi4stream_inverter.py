@@ -1,19 +1,26 @@
 #!//usr//bin//env python3
 
-from random import randint
+import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from random import Random, randint
 
 import cocotb
 from cocotb.clock import Clock
 from cocotb.regression import TestFactory
-from cocotb.scoreboard import Scoreboard
-from cocotb.triggers import RisingEdge, Timer
+from cocotb.triggers import ClockCycles, Event, First, RisingEdge, Timer
 from cocotbext.axi4stream.drivers import Axi4StreamMaster, Axi4StreamSlave
 from cocotbext.axi4stream.monitors import Axi4Stream
 
 CLK_PERIOD = 10
 
+AUX_SIGNALS = ("TDATA", "TSTRB", "TKEEP", "TDEST", "TID", "TUSER")
+
+# Builds the packet corpora in the background, while the DUT is being reset
+CORPUS_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
 
-@cocotb.coroutine
 async def setup_dut(dut):
     cocotb.start_soon(Clock(dut.aclk, CLK_PERIOD, "ns").start())
     dut.aresetn.value = 0
@@ -22,115 +29,297 @@ async def setup_dut(dut):
     await Timer(CLK_PERIOD * 2, "ns")
 
 
-@cocotb.test()
-async def test_tdata(dut, packets_num=5, packet_size=(10, 100), delay=-1, consecutive_transfers=0):
-    """Test TDATA"""
+@lru_cache(maxsize=None)
+def get_widths(dut):
+    """Return the TDATA, TDEST, TID and TUSER widths of the DUT
 
-    tdata_width = dut.C_S_AXIS_TDATA_WIDTH.value.integer
+    They are generics, so they are read from the simulator only once.
+    """
 
-    axis_m = Axi4StreamMaster(dut, "s_axis", dut.aclk)
-    axis_s = Axi4StreamSlave(dut, "m_axis", dut.aclk, delay, consecutive_transfers)
-    axis_monitor = Axi4Stream(dut, "m_axis", dut.aclk, data_type="integer", packets=True)
+    return (dut.C_S_AXIS_TDATA_WIDTH.value.integer,
+            dut.C_S_AXIS_TDEST_WIDTH.value.integer,
+            dut.C_S_AXIS_TID_WIDTH.value.integer,
+            dut.C_S_AXIS_TUSER_WIDTH.value.integer)
 
-    await setup_dut(dut)
 
-    input = []
-    output = []
+def expect_packets(monitor, expected):
+    """Check the packets received by monitor against the expected ones, in order
 
-    # Build the input and output packets
-    for i in range(packets_num):
-        input.append([randint(0, 2**tdata_width - 1) for i in range(randint(*packet_size))])
-        output.append([word ^ 2**tdata_width - 1 for word in input[-1]])
+    Return an Event which is set when all the expected packets have been
+    received.
+    """
 
-    scoreboard = Scoreboard(dut)
-    scoreboard.add_interface(axis_monitor, output)
+    done = Event()
 
-    # Write the input packets
-    for packet in input:
-        await axis_m.write(packet)
+    def compare(received):
+        assert expected, f"Unexpected packet received: {received}"
 
-    # Wait until output is empty (so, all the packets have been received)
-    while output:
-        await RisingEdge(dut.aclk)
+        packet = expected.pop(0)
+        assert received == packet, \
+            f"Received packet {received} does not match the expected one {packet}"
 
-    await RisingEdge(dut.aclk)
+        if not expected:
+            done.set()
 
+    monitor.add_callback(compare)
+    return done
 
-@cocotb.test()
-async def test_aux(dut, packets_num=5, packet_size=(10, 100), delay=-1, consecutive_transfers=0):
-    """Test all the auxiliary AXI4-Stream signals"""
 
-    tdata_width = dut.C_S_AXIS_TDATA_WIDTH.value.integer
-    tdest_width = dut.C_S_AXIS_TDEST_WIDTH.value.integer
-    tid_width = dut.C_S_AXIS_TID_WIDTH.value.integer
-    tuser_width = dut.C_S_AXIS_TUSER_WIDTH.value.integer
+async def wait_drained(dut, done, input):
+    """Wait until done is set (so, all the packets have been received), but fail
+    fast if the DUT stops producing them
+    """
 
-    axis_m = Axi4StreamMaster(dut, "s_axis", dut.aclk)
-    axis_s = Axi4StreamSlave(dut, "m_axis", dut.aclk, delay, consecutive_transfers)
-    axis_monitor = Axi4Stream(dut, "m_axis", dut.aclk, data_type="integer", packets=True, aux_signals=True)
+    drain_timeout = ClockCycles(dut.aclk, 32 * sum(len(packet) for packet in input))
+    fired = await First(done.wait(), drain_timeout)
+    assert fired is not drain_timeout, "Timeout while waiting for the output packets"
 
-    await setup_dut(dut)
+
+# The packets only depend on the parameters below and not on the handshake
+# timing, so they are generated once and shared by all the test variants
+
+@lru_cache(maxsize=None)
+def build_tdata_corpus(tdata_width, packets_num, packet_size, seed):
+    """Build the input and expected output packets of test_tdata
+
+    The expected packets contain strings of binary digits, as sampled by a
+    monitor with data_type="binstr".
+    """
+
+    rng = Random(seed)
+    getrandbits, randint = rng.getrandbits, rng.randint
+    tdata_mask = (1 << tdata_width) - 1
+
+    input = []
+    output = []
+
+    for i in range(packets_num):
+        packet = [getrandbits(tdata_width) for i in range(randint(*packet_size))]
+        input.append(packet)
+        output.append([f"{word ^ tdata_mask:0{tdata_width}b}" for word in packet])
+
+    return tuple(input), tuple(output)
+
+
+@lru_cache(maxsize=None)
+def build_aux_corpus(tdata_width, tdest_width, tid_width, tuser_width, packets_num,
+                     packet_size, seed):
+    """Build the input and expected output packets of run_aux"""
+
+    rng = Random(seed)
+    getrandbits, randint = rng.getrandbits, rng.randint
+    tdata_mask = (1 << tdata_width) - 1
+    tuser_mask = (1 << tuser_width) - 1
+    byte_mask = (1 << (tdata_width // 8)) - 1
 
     input = []
     output = []
 
-    # Build the input and output packets
     for i in range(packets_num):
         first_word = {
-            "TDATA": randint(0, 2**tdata_width - 1),
-            "TSTRB": randint(0, 2**(tdata_width // 8) - 1),
-            "TKEEP": 2**(tdata_width // 8) - 1,
-            "TDEST": randint(0, 2**tdest_width - 1),
-            "TID": randint(0, 2**tid_width - 1),
-            "TUSER": randint(0, 2**tuser_width - 1),
+            "TDATA": getrandbits(tdata_width),
+            "TSTRB": getrandbits(tdata_width // 8),
+            "TKEEP": byte_mask,
+            "TDEST": getrandbits(tdest_width),
+            "TID": getrandbits(tid_width),
+            "TUSER": getrandbits(tuser_width),
         }
         second_word = {
-            "TDATA": randint(0, 2**tdata_width - 1),
-            "TSTRB": 2**(tdata_width // 8) - 1
+            "TDATA": getrandbits(tdata_width),
+            "TSTRB": byte_mask
         }
         input.append(
             [first_word, second_word] +
-            [randint(0, 2**tdata_width - 1) for i in range(randint(*packet_size))])
-
-        output.append([])
-        for input_word in input[-1]:
-            output[-1].append({})
-            for signal in ("TDATA", "TSTRB", "TKEEP", "TDEST", "TID", "TUSER"):
-                if signal == "TDATA" and isinstance(input_word, int):
-                    output[-1][-1]["TDATA"] = input_word
-                else:
-                    try:
-                        # If input_word has that signal, copy it, ...
-                        output[-1][-1][signal] = input_word[signal]
-                    except (KeyError, TypeError):
-                        # ...if not, use the last value
-                        output[-1][-1][signal] = output[-1][-2][signal]
+            [getrandbits(tdata_width) for i in range(randint(*packet_size))])
+
+        # Signals missing from an input word keep their last value
+        output.append([None] * len(input[-1]))
+        last = dict.fromkeys(AUX_SIGNALS, 0)
+        for index, input_word in enumerate(input[-1]):
+            if isinstance(input_word, dict):
+                last = {signal: input_word.get(signal, last[signal])
+                        for signal in AUX_SIGNALS}
+            else:
+                # Plain ints only drive TDATA
+                last = {signal: input_word if signal == "TDATA" else last[signal]
+                        for signal in AUX_SIGNALS}
+            output[-1][index] = last
 
         for output_word in output[-1]:
             # Flip TDATA and TUSER
-            output_word["TDATA"] ^= 2**tdata_width - 1
-            output_word["TUSER"] ^= 2**tuser_width - 1
+            output_word["TDATA"] ^= tdata_mask
+            output_word["TUSER"] ^= tuser_mask
+
+    return tuple(input), tuple(output)
+
+
+async def run_tdata(dut, packets_num, packet_size, delay=-1, consecutive_transfers=0,
+                    back_to_back=True, cache_key=None, **monitor_kwargs):
+    """Write packets of random TDATA words and check them
+
+    monitor_kwargs are passed to the Axi4Stream monitor, which samples the
+    packets as strings of binary digits (or as arrays of ints with
+    collect_raw=True).
+    """
+
+    tdata_width, _, _, _ = get_widths(dut)
+    dut._log.info("Packet corpus seed: %d (set RANDOM_SEED to reproduce it)",
+                  cocotb.RANDOM_SEED)
+    corpus = CORPUS_EXECUTOR.submit(build_tdata_corpus, tdata_width, packets_num,
+                                    tuple(packet_size), cocotb.RANDOM_SEED)
+
+    collect_raw = monitor_kwargs.get("collect_raw", False)
+
+    axis_m = Axi4StreamMaster(dut, "s_axis", dut.aclk)
+    axis_s = Axi4StreamSlave(dut, "m_axis", dut.aclk, delay, consecutive_transfers,
+                             cache_key)
+    axis_monitor = Axi4Stream(dut, "m_axis", dut.aclk, packets=True,
+                              data_type="integer" if collect_raw else "binstr",
+                              **monitor_kwargs)
+
+    await setup_dut(dut)
+
+    input, output = corpus.result()
+    input = list(input)
+    if collect_raw:
+        output = [array("Q", (int(word, 2) for word in packet)) for packet in output]
+    else:
+        output = list(output)
+
+    done = expect_packets(axis_monitor, output)
+
+    if back_to_back:
+        # Write the input packets, back to back
+        await axis_m.write_packets(input)
+    else:
+        # Write the input packets one by one, waiting for a clock edge before
+        # each of them, so that TVALID drops between packets
+        for packet in input:
+            await axis_m.write(packet, sync=True)
 
-    scoreboard = Scoreboard(dut)
-    scoreboard.add_interface(axis_monitor, output)
+    await wait_drained(dut, done, input)
 
-    # Write the input packets
-    for packet in input:
-        await axis_m.write(packet)
 
-    # Wait until output_tdata is empty (so, all the packets have been received)
-    while output:
-        await RisingEdge(dut.aclk)
+@cocotb.test()
+async def test_tdata(dut, packets_num=5, packet_size=(10, 100), delay=-1, consecutive_transfers=0,
+                    back_to_back=True):
+    """Test TDATA"""
+
+    await run_tdata(dut, packets_num, packet_size, delay, consecutive_transfers,
+                    back_to_back)
+
+    await RisingEdge(dut.aclk)
+
+
+@cocotb.test()
+async def test_collect_raw(dut):
+    """Test the monitor collect_raw mode"""
+
+    # The packets are longer than the buffer, which has to be doubled (several
+    # times) to hold each of them
+    await run_tdata(dut, packets_num=5, packet_size=(10, 100), collect_raw=True,
+                    buffer_size=4)
+
+
+@cocotb.test()
+async def test_cache_key(dut):
+    """Test the caching of the slave timing parameters by cache_key"""
+
+    calls = {"tready_delay": 0, "consecutive_transfers": 0}
+
+    def tready_delay(bus):
+        calls["tready_delay"] += 1
+        return randint(1, 5)
+
+    def consecutive_transfers(bus):
+        calls["consecutive_transfers"] += 1
+        return randint(1, 5)
+
+    # With a constant key, each function has to be called only once
+    await run_tdata(dut, packets_num=5, packet_size=(10, 100), delay=tready_delay,
+                    consecutive_transfers=consecutive_transfers,
+                    cache_key=lambda bus: None)
+
+    for name, count in calls.items():
+        assert count == 1, f"{name} called {count} times instead of once"
+
+
+@cocotb.test()
+async def test_tstatus(dut):
+    """Test the monitor sampling the handshake from TSTATUS"""
+
+    # Throttle TREADY, so that TSTATUS also reports back-pressure
+    await run_tdata(dut, packets_num=5, packet_size=(10, 100), delay=1,
+                    consecutive_transfers=1, tstatus=True)
+
+
+async def run_aux(dut, packets_num, packet_size, delay, consecutive_transfers):
+    """Write packets with all the auxiliary AXI4-Stream signals and check them"""
+
+    tdata_width, tdest_width, tid_width, tuser_width = get_widths(dut)
+    dut._log.info("Packet corpus seed: %d (set RANDOM_SEED to reproduce it)",
+                  cocotb.RANDOM_SEED)
+    corpus = CORPUS_EXECUTOR.submit(build_aux_corpus, tdata_width, tdest_width, tid_width,
+                                    tuser_width, packets_num, tuple(packet_size),
+                                    cocotb.RANDOM_SEED)
+
+    axis_m = Axi4StreamMaster(dut, "s_axis", dut.aclk)
+    axis_s = Axi4StreamSlave(dut, "m_axis", dut.aclk, delay, consecutive_transfers)
+    axis_monitor = Axi4Stream(dut, "m_axis", dut.aclk, data_type="integer", packets=True, aux_signals=True)
+
+    await setup_dut(dut)
+
+    input, output = corpus.result()
+    input, output = list(input), list(output)
+
+    done = expect_packets(axis_monitor, output)
+
+    # Write the input packets, back to back
+    await axis_m.write_packets(input)
+
+    await wait_drained(dut, done, input)
+
+
+@cocotb.test()
+async def test_aux_signals(dut):
+    """Test the propagation of all the auxiliary AXI4-Stream signals"""
+
+    await run_aux(dut, packets_num=5, packet_size=(10, 100), delay=1, consecutive_transfers=1)
+
+
+@cocotb.test()
+async def test_aux_timing(dut, delay=-1, consecutive_transfers=0):
+    """Test the auxiliary AXI4-Stream signals with different handshake timings"""
+
+    # The signal propagation is already covered by test_aux_signals: only a few
+    # short packets are needed to exercise the handshake
+    await run_aux(dut, packets_num=2, packet_size=(2, 10), delay=delay,
+                  consecutive_transfers=consecutive_transfers)
 
 
 tdata_test_factory = TestFactory(test_tdata)
 tdata_test_factory.add_option('delay', (0, 1, lambda dut: randint(2, 10)))
 tdata_test_factory.add_option('consecutive_transfers',
                               (0, 1, 5, lambda dut: randint(1, 5)))
+tdata_test_factory.add_option('back_to_back', (True, False))
 tdata_test_factory.generate_tests()
 
-aux_test_factory = TestFactory(test_aux)
+aux_test_factory = TestFactory(test_aux_timing)
 aux_test_factory.add_option('delay', (0, 1, lambda dut: randint(2, 10)))
 aux_test_factory.add_option('consecutive_transfers',
                             (0, 1, 5, lambda dut: randint(1, 5)))
 aux_test_factory.generate_tests()
+
+# Optionally run only one shard of the tests, to split the regression across
+# several simulator processes, e.g. COCOTB_NUM_SHARDS=4 and COCOTB_SHARD=0..3
+# (each with its own COCOTB_RESULTS_FILE)
+num_shards = int(os.getenv("COCOTB_NUM_SHARDS", "1"))
+shard = int(os.getenv("COCOTB_SHARD", "0"))
+if not 0 <= shard < num_shards:
+    raise ValueError(f"COCOTB_SHARD must be in [0, {num_shards}), got {shard}")
+if num_shards > 1:
+    test_names = sorted(name for name, obj in globals().items()
+                        if isinstance(obj, cocotb.test))
+    for index, name in enumerate(test_names):
+        if index % num_shards != shard:
+            del globals()[name]
@@ -30,13 +30,18 @@ entity axi4stream_inverter is
 		m_axis_tid		: out std_logic_vector(C_S_AXIS_TID_WIDTH-1 downto 0);
 		m_axis_tuser	: out std_logic_vector(C_S_AXIS_TUSER_WIDTH-1 downto 0);
 		m_axis_tlast	: out std_logic;
-		m_axis_tready	: in std_logic
+		m_axis_tready	: in std_logic;
+
+		-- Not an AXI4-Stream signal: {m_axis_tready, m_axis_tvalid,
+		-- m_axis_tlast}, sampled by the monitor with a single read
+		m_axis_tstatus	: out std_logic_vector(2 downto 0)
 	);
 end axi4stream_inverter;
 
 architecture Behavioral of axi4stream_inverter is
 
 	signal m_axis_tvalid_int	: std_logic;
+	signal m_axis_tlast_int		: std_logic;
 	signal s_axis_tready_int	: std_logic;
 
 begin
@@ -48,8 +53,11 @@ begin
 	s_axis_tready_int	<= aresetn and (m_axis_tready or not m_axis_tvalid_int);
 
 	m_axis_tvalid		<= m_axis_tvalid_int;
+	m_axis_tlast		<= m_axis_tlast_int;
 	s_axis_tready		<= s_axis_tready_int;
 
+	m_axis_tstatus		<= m_axis_tready & m_axis_tvalid_int & m_axis_tlast_int;
+
 	process(aclk)
 	begin
 		if rising_edge(aclk) then
@@ -78,7 +86,7 @@ begin
 					m_axis_tdest	<= s_axis_tdest;
 					m_axis_tid		<= s_axis_tid;
 					m_axis_tuser	<= not s_axis_tuser;
-					m_axis_tlast	<= s_axis_tlast;
+					m_axis_tlast_int	<= s_axis_tlast;
 				end if;
 
 			end if;